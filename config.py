@@ -1,5 +1,6 @@
 # This file stores all the settings for our project.
 # If we want to change something, we only change it in this one file.
+import os
 from pathlib import Path
 
 # --------------------------------------------------
@@ -20,6 +21,14 @@ PROCESSED_DIR = BASE_DIR / "data" / "processed"
 # Folder where we save the FAISS vector index
 VECTOR_STORE_DIR = str(BASE_DIR / "data" / "vector_store")
 
+# --------------------------------------------------
+# PDF READING
+# --------------------------------------------------
+
+# Most worker processes we start to read PDFs in parallel
+# (at most 8, and never more than the computer has CPU cores)
+PDF_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
 # --------------------------------------------------
 # TEXT CHUNKING SETTINGS
 # --------------------------------------------------
@@ -44,6 +53,19 @@ EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 # The size of each vector this model produces
 EMBEDDING_DIM = 384
 
+# Which engine runs the embedding model:
+#   "torch" = normal PyTorch model (default, works everywhere)
+#   "onnx"  = ONNX Runtime with INT8 weights — 2-4x faster on CPU.
+#             Needs: pip install optimum[onnxruntime]
+EMBEDDING_BACKEND = "torch"
+
+# Where the exported ONNX model is saved, so we only export it once
+ONNX_MODEL_DIR = str(BASE_DIR / "data" / "vector_store" / "onnx")
+
+# How many chunks we send through the model at once.
+# Bigger batches keep the CPU/GPU busier (but use more memory).
+EMBEDDING_BATCH_SIZE = 64
+
 # --------------------------------------------------
 # LLM SETTINGS (the model that generates answers)
 # --------------------------------------------------
@@ -55,9 +77,70 @@ LLM_MODEL = "mistral"
 # Higher temperature = more creative answers
 LLM_TEMPERATURE = 0.2
 
+# How long Ollama keeps the model loaded after a question.
+# Without this it may unload the model between questions and reload it (slow).
+LLM_KEEP_ALIVE = "1h"
+
 # --------------------------------------------------
 # RETRIEVAL SETTINGS
 # --------------------------------------------------
 
 # How many chunks to retrieve from FAISS for each question
 TOP_K_RESULTS = 5
+
+# Small collections use exact (flat) search — it is fast enough and perfect.
+# From this many chunks on, we build an approximate IVF + PQ index instead:
+# vectors are grouped into clusters and compressed, so a search only looks
+# at a few clusters instead of every single vector.
+# Below ~50k chunks the clusters and compression can't be learned well
+# (FAISS wants 39+ training vectors per cluster) and recall suffers.
+IVF_MIN_VECTORS = 50_000
+
+# How many clusters to look into per search (higher = more accurate, slower)
+IVF_NPROBE = 16
+
+# Below this many chunks we skip FAISS for searching and multiply the query
+# with a plain numpy matrix of all vectors: for small collections the FAISS
+# call overhead costs more than the search itself (1 matrix = 1 BLAS call)
+BRUTE_FORCE_MAX_VECTORS = 5_000
+
+# How the exact (flat) index stores each number of a vector:
+#   "fp16" = 16-bit floats, 768 bytes per vector (practically no accuracy loss)
+#   "int8" = 8-bit integers, 384 bytes per vector (4x less than float32,
+#            searches move even fewer bytes; very small accuracy loss)
+FLAT_INDEX_ENCODING = "fp16"
+
+# Keep the exact (flat) index on the GPU when there is one.
+# Needs faiss-gpu instead of faiss-cpu; ignored when no GPU is found.
+FAISS_USE_GPU = False
+
+# How many CPU threads one FAISS search may use (the FAISS_NUM_THREADS
+# environment variable overrides it). FAISS would take every core, but
+# Streamlit answers several sessions at once, and our flat searches wait
+# on memory rather than on the CPU - more threads only fight each other.
+FAISS_NUM_THREADS = 4
+
+# --------------------------------------------------
+# CACHE SETTINGS
+# --------------------------------------------------
+
+# SQLite file where we remember embeddings we already computed.
+# Asking the same question (or re-uploading the same text) then
+# skips the embedding model entirely.
+EMBEDDING_CACHE_PATH = str(BASE_DIR / "data" / "vector_store" / "embeddings.db")
+
+# The embedding cache keeps at most this many vectors (about 1.5 KB each);
+# when it is full, the ones used least recently are deleted first
+EMBEDDING_CACHE_MAX_ROWS = 100_000
+
+# Folder where we keep the chunks + embeddings of every PDF we processed,
+# named by a hash of the file bytes. Re-uploading the same PDF then skips
+# reading, chunking and embedding completely.
+DOC_CACHE_DIR = str(BASE_DIR / "data" / "vector_store" / "doc_cache")
+
+# If a new question is at least this similar (cosine) to a question we
+# already answered, we show the saved answer instead of asking the LLM again.
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+# Saved answers older than this (in seconds) are not reused anymore
+SEMANTIC_CACHE_TTL = 24 * 60 * 60   # one day
@@ -4,35 +4,55 @@
 
 from reportlab.pdfgen import canvas
 
-def create_test_pdf():
-    # Create a PDF at this path
-    path = "data/raw/test.pdf"
-    
+# (title, lines) for each page of the test document
+PAGES = [
+    ("AI Document Intelligence System", [
+        "It contains information about Artificial Intelligence.",
+        "Machine Learning is a subset of AI.",
+        "Deep Learning uses neural networks with many layers.",
+    ]),
+    ("Chapter 2: RAG Systems", [
+        "RAG stands for Retrieval Augmented Generation.",
+        "It combines search with language model generation.",
+        "First we retrieve relevant chunks from documents.",
+        "Then we pass them to an LLM to generate an answer.",
+    ]),
+]
+
+def create_test_pdf(n_pages=len(PAGES), path="data/raw/test.pdf"):
+    """
+    Args:
+        n_pages: how many pages to write (the pages above repeat, each
+                 with its own page number line, so no two pages have the
+                 same text), use a big number to make a large PDF for benchmarking
+        path   : where to save the PDF
+    """
     # Create the PDF canvas
     c = canvas.Canvas(path)
-    
-    # Page 1
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, 750, "AI Document Intelligence System")
-    c.setFont("Helvetica", 12)
-    c.drawString(100, 700, "This is page 1 of our test document.")
-    c.drawString(100, 680, "It contains information about Artificial Intelligence.")
-    c.drawString(100, 660, "Machine Learning is a subset of AI.")
-    c.drawString(100, 640, "Deep Learning uses neural networks with many layers.")
-    
-    # Page 2
-    c.showPage()
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, 750, "Chapter 2: RAG Systems")
-    c.setFont("Helvetica", 12)
-    c.drawString(100, 700, "RAG stands for Retrieval Augmented Generation.")
-    c.drawString(100, 680, "It combines search with language model generation.")
-    c.drawString(100, 660, "First we retrieve relevant chunks from documents.")
-    c.drawString(100, 640, "Then we pass them to an LLM to generate an answer.")
-    
+
+    for page_number in range(n_pages):
+        title, lines = PAGES[page_number % len(PAGES)]
+
+        # Title
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(100, 750, title)
+
+        # Body: one text object per page instead of one per line
+        text = c.beginText(100, 700)
+        text.setFont("Helvetica", 12)
+        text.setLeading(20)
+        # Makes every page unique - identical pages would be deduplicated
+        # (and served from the embedding cache), so a benchmark would measure nothing
+        text.textLine(f"This is page {page_number + 1} of our test document.")
+        for line in lines:
+            text.textLine(line)
+        c.drawText(text)
+
+        c.showPage()
+
     # Save the PDF
     c.save()
-    print("Test PDF created at data/raw/test.pdf")
+    print(f"Test PDF created at {path}")
 
 if __name__ == "__main__":
-    create_test_pdf()
\ No newline at end of file
+    create_test_pdf()
@@ -0,0 +1,159 @@
+# embeddings/cache.py
+# A small on-disk cache for embeddings.
+# Each vector is stored under the SHA-256 of "model|text", so the same text
+# embedded by the same model is only ever computed once.
+# We use SQLite because it ships with Python — no extra install needed.
+# It is an LRU cache: every row remembers when it was last used, and the
+# oldest rows are deleted once there are more than EMBEDDING_CACHE_MAX_ROWS.
+
+import os
+import time
+import hashlib
+import sqlite3
+import numpy as np
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ROWS, EMBEDDING_MODEL, EMBEDDING_BACKEND
+
+# All our vectors are L2-normalized (length 1), so the cache entries are
+# tagged with that too — older un-normalized entries are never reused.
+# The backend is part of the tag because INT8 ONNX vectors differ slightly.
+# (Defined here, not in embeddings.py, so ingestion/doc_cache.py can use it
+# without loading the embedding model's dependencies.)
+CACHE_TAG = f"{EMBEDDING_MODEL}|{EMBEDDING_BACKEND}|normalized"
+
+
+def make_key(model_name: str, text: str) -> bytes:
+    """
+    Builds the cache key for one piece of text.
+
+    Args:
+        model_name: the embedding model that produced the vector
+        text      : the text that was embedded
+
+    Returns:
+        32-byte SHA-256 digest of "model_name|text"
+    """
+    return hashlib.sha256(f"{model_name}|{text}".encode("utf-8")).digest()
+
+
+# Older SQLite versions allow at most 999 "?" placeholders per query
+MAX_KEYS_PER_QUERY = 500
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Opens the cache database, creating it on first use.
+    Streamlit runs every session in its own thread and SQLite connections
+    can't be shared between threads, so we open a fresh one per call.
+    """
+    os.makedirs(os.path.dirname(EMBEDDING_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH)
+    # WAL mode: readers don't block the writer (and the other way round),
+    # so two sessions can embed at the same time
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings "
+        "(key BLOB PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+    )
+    # Lets _evict find the least recently used rows without sorting the table
+    conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+    return conn
+
+
+def _evict(conn: sqlite3.Connection):
+    """Deletes the least recently used rows above EMBEDDING_CACHE_MAX_ROWS"""
+    conn.execute(
+        "DELETE FROM embeddings WHERE key IN ("
+        "SELECT key FROM embeddings ORDER BY last_used "
+        "LIMIT max(0, (SELECT COUNT(*) FROM embeddings) - ?))",
+        (EMBEDDING_CACHE_MAX_ROWS,)
+    )
+
+
+def get(key: bytes):
+    """
+    Looks up a cached vector.
+
+    Args:
+        key: cache key from make_key()
+
+    Returns:
+        float32 numpy array, or None if the key is not cached
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+    conn.close()
+
+    if row is None:
+        return None
+    return np.frombuffer(row[0], dtype=np.float32)
+
+
+def put(key: bytes, vector):
+    """
+    Stores a vector in the cache (overwrites any existing entry).
+
+    Args:
+        key   : cache key from make_key()
+        vector: the embedding to store
+    """
+    blob = np.asarray(vector, dtype=np.float32).tobytes()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)",
+            (key, blob, time.time())
+        )
+        _evict(conn)
+    conn.close()
+
+
+def get_many(keys: list[bytes]) -> dict[bytes, np.ndarray]:
+    """
+    Looks up many cached vectors with one connection and a few big SELECTs.
+
+    Args:
+        keys: cache keys from make_key()
+
+    Returns:
+        {key: float32 numpy array} for the keys that are cached
+        (missing keys are simply not in the dict)
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    found = {}
+
+    with _connect() as conn:
+        for start in range(0, len(unique_keys), MAX_KEYS_PER_QUERY):
+            batch = unique_keys[start:start + MAX_KEYS_PER_QUERY]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        # Mark the hits as just used, so eviction keeps them longest
+        hits = list(found)
+        now = time.time()
+        for start in range(0, len(hits), MAX_KEYS_PER_QUERY):
+            batch = hits[start:start + MAX_KEYS_PER_QUERY]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch])
+    conn.close()
+
+    return found
+
+
+def put_many(keys: list[bytes], vectors):
+    """
+    Stores many vectors in one transaction.
+
+    Args:
+        keys   : cache keys from make_key()
+        vectors: (N, dim) matrix, row i is the vector for keys[i]
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    now = time.time()
+    rows = [(key, vector.tobytes(), now) for key, vector in zip(keys, vectors)]
+    with _connect() as conn:
+        conn.executemany("INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)", rows)
+        _evict(conn)
+    conn.close()
@@ -1,21 +1,79 @@
-# embeddings/embedder.py
+# embeddings/embeddings.py
 # This file converts text chunks into vectors (embeddings).
 # We use a free local model from HuggingFace called all-MiniLM-L6-v2.
 # No API key needed — it runs 100% on your machine.
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sys
+import functools
+import numpy as np
+import streamlit as st
+from config import EMBEDDING_MODEL, EMBEDDING_DIM, EMBEDDING_BATCH_SIZE, EMBEDDING_BACKEND, ONNX_MODEL_DIR
+from embeddings import cache
+from embeddings.cache import CACHE_TAG
+
+# INT8 ONNX file written by export_dynamic_quantized_onnx_model
+# ("avx2" runs on practically every x86 CPU from the last decade)
+ONNX_QUANTIZATION = "avx2"
+ONNX_FILE_NAME = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+
+
+def load_onnx_model():
+    """
+    Loads the INT8 ONNX version of the embedding model.
+
+    The first call exports the model to ONNX, quantizes the weights to INT8
+    and saves everything in ONNX_MODEL_DIR. Later calls just load that file.
+
+    Returns:
+        A SentenceTransformer running on ONNX Runtime (CPU)
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_FILE_NAME)):
+        print(f"Exporting {EMBEDDING_MODEL} to ONNX (one time only)...")
+        model = SentenceTransformer(EMBEDDING_MODEL, backend="onnx", device="cpu")
+        model.save(ONNX_MODEL_DIR)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, ONNX_MODEL_DIR)
+
+    return SentenceTransformer(
+        ONNX_MODEL_DIR,
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"file_name": ONNX_FILE_NAME}
+    )
+
+
+@st.cache_resource(show_spinner="Loading embedding model...")
+def get_embedding_model():
+    """
+    Loads the embedding model once per process.
+
+    Streamlit re-runs the app script on every interaction, so a model
+    created at import time would be rebuilt per rerun and per session.
+    st.cache_resource keeps a single shared instance instead.
+    First time it runs, it will download the model (~90MB).
+    After that it loads from cache instantly.
+
+    Returns:
+        The shared SentenceTransformer instance
+    """
+    # Imported here, not at the top: torch + sentence-transformers take seconds
+    # to import, and only this function (and the ONNX loader) needs them
+    import torch
+    from sentence_transformers import SentenceTransformer
 
-from sentence_transformers import SentenceTransformer
-from config import EMBEDDING_MODEL
+    if EMBEDDING_BACKEND == "onnx":
+        print(f"Loading embedding model: {EMBEDDING_MODEL} (ONNX, INT8)")
+        model = load_onnx_model()
+    else:
+        # Use the GPU when there is one, otherwise the CPU
+        device = "cuda" if torch.cuda.is_available() else "cpu"
 
-# Load the embedding model once when this file is imported.
-# First time it runs, it will download the model (~90MB).
-# After that it loads from cache instantly.
-print(f"Loading embedding model: {EMBEDDING_MODEL}")
-model = SentenceTransformer(EMBEDDING_MODEL)
-print("Model loaded successfully!")
+        print(f"Loading embedding model: {EMBEDDING_MODEL} ({device})")
+        model = SentenceTransformer(EMBEDDING_MODEL, device=device)
+    print("Model loaded successfully!")
+    return model
 
 
 def embed_text(text: str):
@@ -26,21 +84,64 @@ def embed_text(text: str):
         text: any string you want to embed
 
     Returns:
-        A numpy array of 384 numbers representing the meaning of the text
+        A normalized numpy array of 384 numbers representing the meaning of the text
     """
-    vector = model.encode(text)
+    # Same text + same model = same vector, so check the cache first
+    key = cache.make_key(CACHE_TAG, text)
+    vector = cache.get(key)
+    if vector is not None:
+        return vector
+
+    vector = get_embedding_model().encode(
+        text,
+        batch_size=1,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype(np.float32)
+    cache.put(key, vector)
+    return vector
+
+
+@functools.lru_cache(maxsize=512)
+def _embed_query_cached(question: str) -> np.ndarray:
+    """embed_text with an in-memory cache (see embed_query)"""
+    vector = embed_text(question)
+    # The same array is handed out on every cache hit, so make it read-only
+    vector.setflags(write=False)
     return vector
 
 
-def embed_chunks(chunks: list[dict]) -> list[dict]:
+def embed_query(question: str) -> np.ndarray:
     """
-    Takes all our chunks and adds an embedding to each one.
+    Converts a user question into a vector, remembering recent questions.
+
+    Users often ask the same question again (e.g. after "Clear Chat"), so
+    the last 512 question vectors are kept in memory and reused without
+    touching the model or the on-disk cache.
+
+    Args:
+        question: the question typed by the user
+
+    Returns:
+        A read-only normalized numpy array of 384 numbers
+    """
+    # "What is RAG? " and "what is rag?" give the same vector
+    # (our MiniLM model lowercases its input anyway)
+    return _embed_query_cached(question.strip().lower())
+
+
+def embed_chunks(chunks: list[dict]) -> tuple[list[dict], np.ndarray]:
+    """
+    Converts all our chunks into one matrix of embeddings.
+
+    The vectors are kept in a single (N, 384) float32 matrix instead of
+    being copied into every chunk dictionary, so FAISS can take it as is.
 
     Args:
         chunks: list of chunk dictionaries from chunker.py
 
     Returns:
-        Same list of chunks but with an extra "embedding" key added
+        (chunks, embeddings) where embeddings[i] is the vector of chunks[i]
     """
 
     print(f"Embedding {len(chunks)} chunks...")
@@ -48,28 +149,64 @@ def embed_chunks(chunks: list[dict]) -> list[dict]:
     # Extract just the text from each chunk for batch processing
     texts = [chunk["text"] for chunk in chunks]
 
-    # Embed all texts at once (faster than one by one)
-    # show_progress_bar shows a nice loading bar in terminal
-    embeddings = model.encode(texts, show_progress_bar=True)
-
-    # Add the embedding back into each chunk dictionary
-    for i, chunk in enumerate(chunks):
-        chunk["embedding"] = embeddings[i]
-
-    print(f"Done! Each chunk now has a vector of {len(embeddings[0])} numbers")
-    return chunks
+    # One row per chunk, filled from the cache or from the model below
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+
+    # Split the texts into ones we already embedded before (cache hits)
+    # and ones we still need to run through the model (cache misses).
+    # Identical texts (e.g. the same page in two versions of a PDF) share
+    # one cache key, so each distinct text goes through the model only once.
+    keys = [cache.make_key(CACHE_TAG, text) for text in texts]
+    cached = cache.get_many(keys)   # one bulk lookup instead of one query per chunk
+    miss_rows = {}   # cache key -> every row that has that text
+    for i, key in enumerate(keys):
+        vector = cached.get(key)
+        if vector is None:
+            miss_rows.setdefault(key, []).append(i)
+        else:
+            embeddings[i] = vector
+    n_misses = sum(len(rows) for rows in miss_rows.values())
+    print(f"Cache hits: {len(texts) - n_misses}, to embed: {len(miss_rows)}")
+
+    if miss_rows:
+        # Embed all missing texts in batches (faster than one by one)
+        # show_progress_bar shows a nice loading bar in terminal - only
+        # worth it for more than one batch, and only when there is a real
+        # terminal (under Streamlit it would just spam the logs)
+        # normalize_embeddings makes every vector length 1, so the
+        # vector store never has to normalize them again
+        # No need to sort by length ourselves: encode() already orders the
+        # texts by length before batching (so each batch pads to a similar
+        # length) and returns the vectors in our original order.
+        miss_keys = list(miss_rows)
+        miss_texts = [texts[miss_rows[key][0]] for key in miss_keys]
+        show_progress = len(miss_texts) >= EMBEDDING_BATCH_SIZE and sys.stderr.isatty()
+        new_vectors = get_embedding_model().encode(
+            miss_texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            show_progress_bar=show_progress,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+
+        # Put the new vectors back in their original rows and remember them
+        for key, vector in zip(miss_keys, new_vectors):
+            embeddings[miss_rows[key]] = vector
+        cache.put_many(miss_keys, new_vectors)
+
+    print(f"Done! Embedding matrix shape: {embeddings.shape}")
+    return chunks, embeddings
 
 
 # --------------------------------------------------
-# TEST: Run this file directly to test it
+# TEST: Run `python -m embeddings.embeddings` to test it
 # --------------------------------------------------
 
 if __name__ == "__main__":
 
     # Import our previous steps
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'ingestion'))
-    from pdf_loader import load_pdf
-    from chunker import chunk_pages
+    from ingestion.pdf_loader import load_pdf
+    from ingestion.chunker import chunk_pages
 
     # Step 1: Load PDF
     pages = load_pdf("data/raw/test.pdf")
@@ -78,12 +215,12 @@ if __name__ == "__main__":
     chunks = chunk_pages(pages)
 
     # Step 3: Embed chunks
-    embedded_chunks = embed_chunks(chunks)
+    chunks, embeddings = embed_chunks(chunks)
 
     # Preview the result
     print("\n--- Embedding Preview ---")
-    first_chunk = embedded_chunks[0]
+    first_chunk = chunks[0]
     print(f"Chunk ID  : {first_chunk['chunk_id']}")
     print(f"Text      : {first_chunk['text'][:100]}")
-    print(f"Embedding shape : {first_chunk['embedding'].shape}")
-    print(f"First 5 numbers : {first_chunk['embedding'][:5]}")
\ No newline at end of file
+    print(f"Embedding shape : {embeddings[0].shape}")
+    print(f"First 5 numbers : {embeddings[0][:5]}")
\ No newline at end of file
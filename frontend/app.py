@@ -2,22 +2,42 @@
 # This is the Streamlit web interface for our RAG system.
 # Users can upload PDFs, ask questions, and get answers with sources.
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import streamlit as st
+import numpy as np
 from pathlib import Path
 import shutil
 
 # Import our backend components
-from ingestion.pdf_loader import load_pdf
-from ingestion.chunker import chunk_pages
-from embeddings.embeddings import embed_chunks, embed_text
+from ingestion.ingest import ingest_pdfs
+from ingestion import doc_cache
+from embeddings.embeddings import embed_chunks, embed_query
 from retrieval.vector_store import VectorStore
-from rag.pipeline import generate_answer
+from rag.pipeline import generate_answer_stream, get_sources, get_llm_client
+from rag.semantic_cache import SemanticCache, hash_context
 from config import RAW_DIR, VECTOR_STORE_DIR
 
+# Reading the saved index costs time and memory, so do it once per process
+# and let every session use the same copy
+@st.cache_resource(show_spinner=False)
+def load_saved_store():
+    """Load the saved index once per process; all sessions share it (it is read-only)"""
+    vector_store = VectorStore()
+    if vector_store.load_from_disk():
+        return vector_store
+    return None
+
+
+# One answer cache per process, shared by all sessions: a cache per
+# session would overwrite the answers other sessions saved
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticCache:
+    """The process-wide semantic cache, loaded from disk once (it locks itself)"""
+    semantic_cache = SemanticCache()
+    semantic_cache.load_from_disk()
+    return semantic_cache
+
+
 # Page config
 st.set_page_config(
     page_title="AI Document Intelligence",
@@ -58,28 +78,61 @@ with st.sidebar:
                     os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
                     
                     # Save uploaded files
-                    all_chunks = []
+                    # Each entry becomes (chunks, embeddings) for that file
+                    doc_results = [None] * len(uploaded_files)
+                    to_process = []   # (position, doc_hash, uploaded_file) of files not seen before
                     processed_names = []
                     
-                    for uploaded_file in uploaded_files:
-                        # Save to raw directory
-                        file_path = os.path.join(RAW_DIR, uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
+                    for i, uploaded_file in enumerate(uploaded_files):
+                        # Same bytes = same chunks + embeddings, so check the cache first
+                        doc_hash = doc_cache.hash_bytes(uploaded_file.getbuffer())
+                        cached = doc_cache.load_document(doc_hash, uploaded_file.name)
+                        
+                        if cached is not None:
+                            doc_results[i] = cached
+                        else:
+                            # Save to raw directory
+                            file_path = os.path.join(RAW_DIR, uploaded_file.name)
+                            with open(file_path, "wb") as f:
+                                f.write(uploaded_file.getbuffer())
+                            to_process.append((i, doc_hash, uploaded_file))
                         
-                        # Process the PDF
-                        pages = load_pdf(file_path)
-                        chunks = chunk_pages(pages)
-                        all_chunks.extend(chunks)
                         processed_names.append(uploaded_file.name)
                     
-                    # Embed all chunks
-                    embedded_chunks = embed_chunks(all_chunks)
+                    if to_process:
+                        # Read and chunk all new PDFs in parallel, straight from the
+                        # uploaded bytes: two uploads with the same name would
+                        # overwrite each other's file in RAW_DIR
+                        chunk_lists = ingest_pdfs(
+                            [uploaded_file.getvalue() for _, _, uploaded_file in to_process],
+                            [uploaded_file.name for _, _, uploaded_file in to_process]
+                        )
+                        
+                        # Embed the chunks of all new files in one batched call
+                        new_chunks = [chunk for chunks in chunk_lists for chunk in chunks]
+                        new_chunks, new_embeddings = embed_chunks(new_chunks)
+                        
+                        # Give every file its own rows back and cache them
+                        start = 0
+                        for (i, doc_hash, _), chunks in zip(to_process, chunk_lists):
+                            embeddings = new_embeddings[start:start + len(chunks)]
+                            start += len(chunks)
+                            doc_cache.save_document(doc_hash, chunks, embeddings)
+                            doc_results[i] = (chunks, embeddings)
+                    
+                    all_chunks = [chunk for chunks, _ in doc_results for chunk in chunks]
+                    all_embeddings = [embeddings for _, embeddings in doc_results]
                     
                     # Build vector store
                     vector_store = VectorStore()
-                    vector_store.add_chunks(embedded_chunks)
+                    vector_store.add_chunks(all_chunks, np.vstack(all_embeddings))
                     vector_store.save_to_disk()
+                    load_saved_store.clear()   # the saved index changed
+                    
+                    # Old answers belong to the old documents, so start a fresh answer cache
+                    semantic_cache = get_semantic_cache()
+                    semantic_cache.clear()
+                    semantic_cache.save_to_disk()
                     
                     # Save to session state
                     st.session_state.vector_store = vector_store
@@ -104,11 +157,16 @@ with st.sidebar:
     st.divider()
     if st.button("📂 Load Existing Index"):
         try:
-            vector_store = VectorStore()
-            if vector_store.load_from_disk():
+            vector_store = load_saved_store()
+            if vector_store is not None:
                 st.session_state.vector_store = vector_store
+                
+                # Answers saved for this index can be reused
+                get_semantic_cache().load_from_disk()
                 st.success("✅ Loaded existing index!")
             else:
+                # Don't remember "no index": one may be saved later
+                load_saved_store.clear()
                 st.warning("No existing index found")
         except Exception as e:
             st.error(f"Error loading index: {str(e)}")
@@ -140,32 +198,48 @@ else:
         
         # Generate answer
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Embed query and search
-                    query_embedding = embed_text(question)
+            try:
+                with st.spinner("Thinking..."):
+                    # Embed query
+                    query_embedding = embed_query(question)
+                    
+                    # Search for relevant chunks
                     retrieved_chunks = st.session_state.vector_store.search(query_embedding)
                     
-                    # Generate answer
-                    result = generate_answer(question, retrieved_chunks)
+                    # Reuse the answer of an (almost) identical earlier question
+                    # that was answered from the same chunks
+                    semantic_cache = get_semantic_cache()
+                    context_hash = hash_context(retrieved_chunks)
+                    result = semantic_cache.lookup(question, query_embedding, context_hash)
+                
+                if result is None:
+                    # Show the answer word by word while the LLM writes it
+                    answer = st.write_stream(generate_answer_stream(question, retrieved_chunks, client=get_llm_client()))
+                    result = {
+                        'answer': answer,
+                        'sources': get_sources(retrieved_chunks)
+                    }
                     
-                    # Display answer
+                    semantic_cache.add(question, query_embedding, context_hash, result)
+                    semantic_cache.save_to_disk()
+                else:
+                    # Display cached answer
                     st.markdown(result['answer'])
-                    
-                    # Display sources
-                    with st.expander("📎 Sources"):
-                        for source in result['sources']:
-                            st.text(f"• {source['source']} (Page {source['page']}) - Relevance: {source['relevance']}")
-                    
-                    # Add to chat history
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": result['answer'],
-                        "sources": result['sources']
-                    })
-                    
-                except Exception as e:
-                    st.error(f"Error generating answer: {str(e)}")
+                
+                # Display sources
+                with st.expander("📎 Sources"):
+                    for source in result['sources']:
+                        st.text(f"• {source['source']} (Page {source['page']}) - Relevance: {source['relevance']}")
+                
+                # Add to chat history
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": result['answer'],
+                    "sources": result['sources']
+                })
+                
+            except Exception as e:
+                st.error(f"Error generating answer: {str(e)}")
     
     # Clear chat button
     if st.button("🗑️ Clear Chat"):
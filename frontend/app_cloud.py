@@ -1,19 +1,72 @@
 # frontend/app_cloud.py
 # Cloud deployment version - Mobile optimized
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import streamlit as st
 
 # Import cloud-specific components
 from ingestion.pdf_loader import load_pdf
 from ingestion.chunker import chunk_pages
-from embeddings.embeddings import embed_chunks, embed_text
+from ingestion import doc_cache
+from embeddings.embeddings import embed_chunks, embed_query
 from retrieval.vector_store import VectorStore
-from rag.pipelinecloud import generate_answer  # Use cloud version
-from config import RAW_DIR, VECTOR_STORE_DIR
+from rag.pipelinecloud import generate_answer_stream, get_sources, get_llm_client  # Use cloud version
+from rag.semantic_cache import SemanticCache, hash_context
+from config import VECTOR_STORE_DIR
+
+
+# Both helpers are keyed by the SHA-256 of the file and its name (the chunks
+# cite the name), so processing the same PDF again (in any session) is a
+# dictionary lookup. Arguments starting with
+# "_" are not hashed by Streamlit - the hash already identifies them.
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def process_document(doc_hash: str, _file_bytes: bytes, file_name: str):
+    """Extract, chunk and embed one PDF -> (chunks, embeddings)"""
+    # Same bytes = same chunks + embeddings, so check the disk cache first
+    cached = doc_cache.load_document(doc_hash, file_name)
+    if cached is not None:
+        return cached
+    
+    # Process straight from memory (the cloud disk is temporary anyway)
+    pages = load_pdf(_file_bytes, file_name=file_name)
+    chunks = chunk_pages(pages)
+    
+    # Always pass the whole document at once: embed_chunks sends the texts to
+    # the model in batches of EMBEDDING_BATCH_SIZE (config.py), which is many
+    # times faster than embedding chunk by chunk
+    chunks, embeddings = embed_chunks(chunks)
+    doc_cache.save_document(doc_hash, chunks, embeddings)
+    return chunks, embeddings
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_vector_store(doc_hash: str, file_name: str, _chunks: list, _embeddings) -> VectorStore:
+    """Build the FAISS index for one processed PDF"""
+    vector_store = VectorStore()
+    vector_store.add_chunks(_chunks, _embeddings)
+    return vector_store
+
+
+# Reading the saved index costs time and memory, so do it once per process
+# and let every session use the same copy
+@st.cache_resource(show_spinner=False)
+def load_saved_store():
+    """Load the saved index once per process; all sessions share it (it is read-only)"""
+    vector_store = VectorStore()
+    if vector_store.load_from_disk():
+        return vector_store
+    return None
+
+
+# One answer cache per process, shared by all sessions: a cache per
+# session would overwrite the answers other sessions saved
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticCache:
+    """The process-wide semantic cache, loaded from disk once (it locks itself)"""
+    semantic_cache = SemanticCache()
+    semantic_cache.load_from_disk()
+    return semantic_cache
 
 
 # Page config
@@ -65,7 +118,6 @@ with st.sidebar:
             with st.spinner("Processing document..."):
                 try:
                     # Create directories
-                    os.makedirs(RAW_DIR, exist_ok=True)
                     os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
                     
                     st.info(f"Processing: {uploaded_file.name}")
@@ -75,32 +127,24 @@ with st.sidebar:
                         st.error(f"❌ File too large (max 10MB)")
                         st.stop()
                     
-                    # Save file
-                    file_path = os.path.join(RAW_DIR, uploaded_file.name)
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
+                    # Read the upload once; everything below works on these bytes
+                    file_bytes = uploaded_file.getvalue()
                     
-                    st.success(f"✅ Saved")
-                    
-                    # Process
-                    st.info("Extracting text...")
-                    pages = load_pdf(file_path)
-                    st.success(f"✅ Extracted {len(pages)} pages")
-                    
-                    st.info("Chunking...")
-                    chunks = chunk_pages(pages)
+                    # Extract, chunk and embed (cached by file hash)
+                    doc_hash = doc_cache.hash_bytes(file_bytes)
+                    chunks, embeddings = process_document(doc_hash, file_bytes, uploaded_file.name)
                     st.success(f"✅ Created {len(chunks)} chunks")
                     
-                    # Embed
-                    st.info("Generating embeddings...")
-                    embedded_chunks = embed_chunks(chunks)
-                    st.success("✅ Embeddings done")
-                    
-                    # Build index
+                    # Build index (also cached by file hash)
                     st.info("Building index...")
-                    vector_store = VectorStore()
-                    vector_store.add_chunks(embedded_chunks)
+                    vector_store = build_vector_store(doc_hash, uploaded_file.name, chunks, embeddings)
                     vector_store.save_to_disk()
+                    load_saved_store.clear()   # the saved index changed
+                    
+                    # Old answers belong to the old documents, so start a fresh answer cache
+                    semantic_cache = get_semantic_cache()
+                    semantic_cache.clear()
+                    semantic_cache.save_to_disk()
                     
                     st.session_state.vector_store = vector_store
                     st.session_state.processed_files = [uploaded_file.name]
@@ -124,11 +168,16 @@ with st.sidebar:
     st.divider()
     if st.button("📂 Load Existing Index"):
         try:
-            vector_store = VectorStore()
-            if vector_store.load_from_disk():
+            vector_store = load_saved_store()
+            if vector_store is not None:
                 st.session_state.vector_store = vector_store
+                
+                # Answers saved for this index can be reused
+                get_semantic_cache().load_from_disk()
                 st.success("✅ Loaded!")
             else:
+                # Don't remember "no index": one may be saved later
+                load_saved_store.clear()
                 st.warning("No index found")
         except Exception as e:
             st.error(f"Error: {str(e)}")
@@ -160,26 +209,42 @@ else:
         
         # Generate answer
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    query_embedding = embed_text(question)
+            try:
+                with st.spinner("Thinking..."):
+                    query_embedding = embed_query(question)
                     retrieved_chunks = st.session_state.vector_store.search(query_embedding)
-                    result = generate_answer(question, retrieved_chunks)
-                    
-                    st.markdown(result['answer'])
-                    
-                    with st.expander("📎 Sources"):
-                        for source in result['sources']:
-                            st.text(f"• {source['source']} (Page {source['page']}) - Relevance: {source['relevance']}")
                     
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": result['answer'],
-                        "sources": result['sources']
-                    })
+                    # Reuse the answer of an (almost) identical earlier question
+                    # that was answered from the same chunks
+                    semantic_cache = get_semantic_cache()
+                    context_hash = hash_context(retrieved_chunks)
+                    result = semantic_cache.lookup(question, query_embedding, context_hash)
+                
+                if result is None:
+                    # Show the answer word by word while it is generated
+                    answer = st.write_stream(generate_answer_stream(question, retrieved_chunks, client=get_llm_client()))
+                    result = {
+                        'answer': answer,
+                        'sources': get_sources(retrieved_chunks)
+                    }
                     
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+                    semantic_cache.add(question, query_embedding, context_hash, result)
+                    semantic_cache.save_to_disk()
+                else:
+                    st.markdown(result['answer'])
+                
+                with st.expander("📎 Sources"):
+                    for source in result['sources']:
+                        st.text(f"• {source['source']} (Page {source['page']}) - Relevance: {source['relevance']}")
+                
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": result['answer'],
+                    "sources": result['sources']
+                })
+                
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
     
     if st.button("🗑️ Clear Chat"):
         st.session_state.chat_history = []
@@ -2,13 +2,17 @@
 # and splits them into smaller overlapping chunks.
 # These chunks are what we will convert to vectors later.
 
-import sys
-import os
+from config import CHUNK_SIZE, CHUNK_OVERLAP
 
-# This allows us to import config.py from the root folder
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Increase this whenever a code change makes the chunks of the same text
+# different (e.g. new fields or other cut points), so cached documents
+# (ingestion/doc_cache.py) are chunked again
+CHUNKER_VERSION = 1
 
-from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+def make_chunk_id(source: str, page_number: int, chunk_index: int) -> str:
+    """Unique name of a chunk, e.g. test.pdf_page1_chunk0"""
+    return f"{source}_page{page_number}_chunk{chunk_index}"
 
 
 def split_text_into_chunks(text: str, source: str, page_number: int) -> list[dict]:
@@ -16,7 +20,7 @@ def split_text_into_chunks(text: str, source: str, page_number: int) -> list[dic
     Splits a single page's text into smaller overlapping chunks.
 
     Args:
-        text        : the full text of one page
+        text        : the full text of one page (already stripped)
         source      : the filename this text came from
         page_number : which page this text is from
 
@@ -27,44 +31,30 @@ def split_text_into_chunks(text: str, source: str, page_number: int) -> list[dic
                 "chunk_id"   : "test.pdf_page1_chunk0",
                 "text"       : "first 500 characters...",
                 "source"     : "test.pdf",
-                "page_number": 1
+                "page_number": 1,
+                "chunk_index": 0
             },
             ...
         ]
     """
 
-    chunks = []       # this will store all our chunks
-    start  = 0        # starting position in the text
-    chunk_index = 0   # to number each chunk
-
-    # Keep slicing the text until we reach the end
-    while start < len(text):
-
-        # Get a slice of text from start to start + CHUNK_SIZE
-        end = start + CHUNK_SIZE
-
-        # Extract the chunk
-        chunk_text = text[start:end]
-
-        # Create a unique ID for this chunk
-        chunk_id = f"{source}_page{page_number}_chunk{chunk_index}"
-
-        # Store the chunk with its metadata
-        chunk = {
-            "chunk_id"   : chunk_id,
-            "text"       : chunk_text.strip(),
+    # Every chunk starts CHUNK_SIZE - CHUNK_OVERLAP characters after the previous one
+    # This creates the overlap between chunks
+    starts = range(0, len(text), CHUNK_SIZE - CHUNK_OVERLAP)
+
+    # Build all chunks in one list comprehension (no append per chunk)
+    # No .strip() per chunk: load_pdf already stripped the whole page, so
+    # only a chunk's inner edges can be whitespace, and those are harmless
+    return [
+        {
+            "chunk_id"   : make_chunk_id(source, page_number, chunk_index),
+            "text"       : text[start:start + CHUNK_SIZE],
             "source"     : source,
-            "page_number": page_number
+            "page_number": page_number,
+            "chunk_index": chunk_index   # position on the page (neighbours differ by 1)
         }
-
-        chunks.append(chunk)
-
-        # Move start forward by CHUNK_SIZE minus CHUNK_OVERLAP
-        # This creates the overlap between chunks
-        start += CHUNK_SIZE - CHUNK_OVERLAP
-        chunk_index += 1
-
-    return chunks
+        for chunk_index, start in enumerate(starts)
+    ]
 
 
 def chunk_pages(pages: list[dict]) -> list[dict]:
@@ -96,13 +86,13 @@ def chunk_pages(pages: list[dict]) -> list[dict]:
 
 
 # --------------------------------------------------
-# TEST: Run this file directly to test it
+# TEST: Run `python -m ingestion.chunker` to test it
 # --------------------------------------------------
 
 if __name__ == "__main__":
 
     # First load the PDF using our pdf_loader
-    from pdf_loader import load_pdf
+    from ingestion.pdf_loader import load_pdf
 
     # Load our test PDF
     pages = load_pdf("data/raw/test.pdf")
@@ -0,0 +1,89 @@
+# ingestion/doc_cache.py
+# Remembers the result of processing a PDF (its chunks and their embeddings).
+# Files are identified by the SHA-256 of their bytes, so uploading the exact
+# same PDF again — even under another name — reuses the saved result.
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+from config import DOC_CACHE_DIR, CHUNK_SIZE, CHUNK_OVERLAP
+from embeddings.cache import CACHE_TAG
+from ingestion.chunker import CHUNKER_VERSION, make_chunk_id
+
+# Everything besides the file itself that decides its chunks and embeddings.
+# Results are kept in one sub-folder per combination, so changing the model
+# or the chunking never reuses results made with the old settings.
+SETTINGS_TAG = f"{CACHE_TAG}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|chunker{CHUNKER_VERSION}"
+SETTINGS_DIR = os.path.join(DOC_CACHE_DIR, hashlib.sha256(SETTINGS_TAG.encode("utf-8")).hexdigest()[:16])
+
+
+def hash_bytes(data) -> str:
+    """
+    Computes the cache key of a file.
+
+    Args:
+        data: the raw file contents (bytes or memoryview)
+
+    Returns:
+        Hex SHA-256 digest of the contents
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_path(doc_hash: str) -> str:
+    return os.path.join(SETTINGS_DIR, f"{doc_hash}.npz")
+
+
+def load_document(doc_hash: str, file_name: str):
+    """
+    Loads a previously processed document.
+
+    Args:
+        doc_hash : key from hash_bytes()
+        file_name: the name the file was uploaded under this time
+
+    Returns:
+        (chunks, embeddings) like embed_chunks returns, or None if not cached
+    """
+    path = _cache_path(doc_hash)
+    if not os.path.exists(path):
+        return None
+
+    # chunks are stored as an object array, so numpy needs allow_pickle
+    with np.load(path, allow_pickle=True) as data:
+        chunks = data["chunks"].tolist()
+        embeddings = data["emb"]
+
+    # The same bytes may come back under another name: cite the current one
+    for chunk in chunks:
+        chunk["source"] = file_name
+        chunk["chunk_id"] = make_chunk_id(file_name, chunk["page_number"], chunk["chunk_index"])
+
+    print(f"Loaded {len(chunks)} cached chunks for document {doc_hash[:12]}")
+    return chunks, embeddings
+
+
+def save_document(doc_hash: str, chunks: list[dict], embeddings: np.ndarray):
+    """
+    Saves a processed document so we can skip the work next time.
+
+    Args:
+        doc_hash  : key from hash_bytes()
+        chunks    : list of chunk dicts
+        embeddings: (N, 384) matrix, row i = chunks[i]
+    """
+    os.makedirs(SETTINGS_DIR, exist_ok=True)
+
+    # Build the object array by hand: np.array(list_of_dicts) would work too,
+    # but this can never be misread as a 2-D array
+    chunk_array = np.empty(len(chunks), dtype=object)
+    chunk_array[:] = chunks
+
+    # Write to a temporary file first and then move it into place, so a
+    # crash (or another session saving the same PDF) never leaves a
+    # half-written file behind. Each writer gets its own temporary file.
+    fd, tmp_path = tempfile.mkstemp(dir=SETTINGS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez_compressed(f, chunks=chunk_array, emb=embeddings)
+    os.replace(tmp_path, _cache_path(doc_hash))
@@ -0,0 +1,46 @@
+# ingestion/ingest.py
+# Reads and chunks several PDFs at the same time.
+# PyMuPDF is not thread-safe, so instead of threads we use separate
+# processes — each one opens its own PDF, and all CPU cores get used.
+
+from ingestion.pdf_loader import load_pdf, process_pool
+from ingestion.chunker import chunk_pages
+from config import PDF_MAX_WORKERS
+
+
+def ingest_pdf(source, file_name: str = None) -> list[dict]:
+    """
+    Loads one PDF and splits it into chunks.
+
+    Args:
+        source   : the full path to the PDF file, or the PDF bytes
+        file_name: name to show as the source (see load_pdf)
+
+    Returns:
+        List of chunk dictionaries (see chunker.py)
+    """
+    pages = load_pdf(source, file_name=file_name)
+    return chunk_pages(pages)
+
+
+def ingest_pdfs(sources: list, file_names: list[str] = None) -> list[list[dict]]:
+    """
+    Loads and chunks many PDFs in parallel.
+
+    Args:
+        sources   : full paths of the PDF files, or their bytes
+        file_names: name of each file (default: taken from the paths)
+
+    Returns:
+        One list of chunks per file, in the same order as sources
+    """
+    if file_names is None:
+        file_names = [None] * len(sources)
+
+    # Starting processes costs time, so don't bother for a single file
+    # (or on a machine with a single CPU core)
+    if len(sources) <= 1 or PDF_MAX_WORKERS <= 1:
+        return [ingest_pdf(source, name) for source, name in zip(sources, file_names)]
+
+    with process_pool(min(PDF_MAX_WORKERS, len(sources))) as executor:
+        return list(executor.map(ingest_pdf, sources, file_names))
@@ -4,13 +4,82 @@
 
 import fitz  # this is PyMuPDF
 import os    # to work with file paths
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import PDF_MAX_WORKERS
 
-def load_pdf(file_path: str) -> list[dict]:
+# Plain text extraction settings for page.get_text():
+# keep whitespace, ignore text outside the visible page, and let MuPDF
+# split ligatures like "ﬁ" into normal letters (no extra work to keep them)
+TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# One summary line per PDF; set PDF_VERBOSE=1 to also log every page
+log = logging.getLogger(__name__)
+VERBOSE = bool(os.getenv("PDF_VERBOSE"))
+
+# PDFs with at least this many pages are split over several processes
+# (starting a process costs more than reading a few dozen pages)
+PARALLEL_MIN_PAGES = 100
+
+
+def open_pdf(pdf_source):
+    """Opens a PDF from a file path (str) or from bytes in memory"""
+    if isinstance(pdf_source, str):
+        return fitz.open(pdf_source)
+    return fitz.open(stream=pdf_source, filetype="pdf")
+
+
+def process_pool(n_workers: int) -> ProcessPoolExecutor:
+    """
+    Pool of worker processes for reading PDFs.
+
+    "spawn" starts clean processes; forking the (multi-threaded)
+    Streamlit server process is not safe.
+    """
+    return ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def extract_page_range(pdf_source, start: int, end: int) -> list[str]:
+    """
+    Extracts the stripped text of pages start..end-1.
+
+    Runs in a worker process: PyMuPDF is not thread-safe, so every
+    worker opens its own copy of the PDF instead of sharing one.
+    """
+    with open_pdf(pdf_source) as pdf:
+        return [pdf[i].get_text("text", flags=TEXT_FLAGS).strip() for i in range(start, end)]
+
+
+def extract_texts_parallel(pdf_source, total_pages: int) -> list[str]:
+    """
+    Extracts all page texts using several processes.
+
+    Args:
+        pdf_source : file path (str) or the PDF bytes
+        total_pages: number of pages in the PDF
+
+    Returns:
+        The stripped text of every page, in page order
+    """
+    # One contiguous range of pages per worker
+    step = -(-total_pages // PDF_MAX_WORKERS)   # round up
+    starts = list(range(0, total_pages, step))
+    ends = [min(start + step, total_pages) for start in starts]
+
+    with process_pool(len(starts)) as executor:
+        results = executor.map(extract_page_range, [pdf_source] * len(starts), starts, ends)
+        return [text for texts in results for text in texts]
+
+
+def load_pdf(source, file_name: str = None) -> list[dict]:
     """
     Reads a PDF file and extracts text page by page.
 
     Args:
-        file_path: the full path to the PDF file
+        source   : the full path to the PDF file, or the PDF itself
+                   as bytes / a file-like object (e.g. an upload in memory)
+        file_name: name to show as the source (default: taken from the path)
 
     Returns:
         A list of dictionaries. Each dictionary = one page.
@@ -25,54 +94,66 @@ def load_pdf(file_path: str) -> list[dict]:
         ]
     """
 
-    # Check if the file actually exists before trying to open it
-    if not os.path.exists(file_path):
-        print(f"Error: File not found → {file_path}")
-        return []
-
-    # This will hold all our extracted pages
-    pages = []
+    if isinstance(source, (str, os.PathLike)):
+        # Check if the file actually exists before trying to open it
+        if not os.path.exists(source):
+            log.error("File not found: %s", source)
+            return []
 
-    # Get just the filename (e.g. "report.pdf") from the full path
-    file_name = os.path.basename(file_path)
+        # Get just the filename (e.g. "report.pdf") from the full path
+        file_name = file_name or os.path.basename(source)
+        pdf_source = os.fspath(source)
+    else:
+        # The PDF is already in memory — no need to write it to disk first
+        pdf_source = source.read() if hasattr(source, "read") else bytes(source)
+        file_name = file_name or "document.pdf"
 
-    print(f"Opening PDF: {file_name}")
+    pdf = open_pdf(pdf_source)
 
-    # Open the PDF using PyMuPDF
     # 'with' means it will automatically close the file when done
-    with fitz.open(file_path) as pdf:
+    with pdf:
 
         total_pages = len(pdf)
-        print(f"Total pages found: {total_pages}")
 
-        # Loop through every page in the PDF
-        for page_index in range(total_pages):
+        # Big PDFs: extract page ranges in parallel processes.
+        # Not when we already are a worker (ingest.py reads several PDFs in
+        # parallel) — then all cores are busy already — and not with a single
+        # CPU core, where one extra process only adds its startup time.
+        if (total_pages >= PARALLEL_MIN_PAGES and PDF_MAX_WORKERS > 1
+                and multiprocessing.parent_process() is None):
+            texts = extract_texts_parallel(pdf_source, total_pages)
+        else:
+            texts = [pdf[i].get_text("text", flags=TEXT_FLAGS).strip() for i in range(total_pages)]
 
-            # Get the page object (page_index starts from 0)
-            page = pdf[page_index]
+        # One slot per page up front; empty pages leave their slot unused
+        pages = [None] * total_pages
+        n_pages = 0
+        total_chars = 0
 
-            # Extract all the text from this page
-            text = page.get_text()
+        # Loop through every page in the PDF (page_index starts from 0)
+        for page_index, text in enumerate(texts):
 
             # Sometimes pages are empty (like blank pages or image-only pages)
             # We skip those
-            if text.strip() == "":
-                print(f"  Page {page_index + 1}: empty, skipping...")
+            if not text:
                 continue
 
             # Create a dictionary for this page with all useful info
-            page_data = {
+            pages[n_pages] = {
                 "page_number": page_index + 1,  # humans count from 1
-                "text": text.strip(),            # remove extra whitespace
+                "text": text,                    # already stripped above
                 "source": file_name              # which file this came from
             }
+            n_pages += 1
+            total_chars += len(text)
 
-            # Add this page to our list
-            pages.append(page_data)
+            if VERBOSE:
+                log.info("  Page %d: extracted %d characters", page_index + 1, len(text))
 
-            print(f"  Page {page_index + 1}: extracted {len(text)} characters")
+        # Drop the unused slots of the skipped empty pages
+        del pages[n_pages:]
 
-    print(f"\nDone! Extracted {len(pages)} pages from {file_name}")
+    log.info("Extracted %d/%d pages (%d characters) from %s", len(pages), total_pages, total_chars, file_name)
     return pages
 
 # --------------------------------------------------
@@ -83,6 +164,9 @@ def load_pdf(file_path: str) -> list[dict]:
 
 if __name__ == "__main__":
 
+    # Show our log messages in the terminal
+    logging.basicConfig(level=logging.INFO)
+
     # Change this to any PDF file you have on your computer
     test_file = "data/raw/test.pdf"
 
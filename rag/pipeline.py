@@ -6,132 +6,96 @@
 # 3. Send chunks + question to LLM
 # 4. LLM generates an answer based on the retrieved context
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import ollama
-from config import LLM_MODEL, LLM_TEMPERATURE, TOP_K_RESULTS
+import streamlit as st
+from config import LLM_MODEL, LLM_TEMPERATURE, LLM_KEEP_ALIVE, TOP_K_RESULTS
+from rag.prompt import build_context, create_messages, get_sources
 
 
-def build_context(retrieved_chunks: list) -> str:
+@st.cache_resource
+def get_llm_client() -> ollama.Client:
     """
-    Takes the retrieved chunks and formats them into a context string.
+    Creates one Ollama client per process and reuses it for every question,
+    so its HTTP connection to the Ollama server stays open.
     
-    Args:
-        retrieved_chunks: list of (chunk, distance) tuples from vector_store
-        
     Returns:
-        Formatted context string with sources
+        The shared ollama.Client
     """
-    context_parts = []
-    
-    for i, (chunk, distance) in enumerate(retrieved_chunks, 1):
-        source_info = f"[Source: {chunk['source']}, Page {chunk['page_number']}]"
-        chunk_text = chunk['text']
-        
-        context_parts.append(f"Chunk {i} {source_info}:\n{chunk_text}\n")
-    
-    return "\n".join(context_parts)
-
-def create_prompt(question: str, context: str) -> str:
-    """
-    Creates the full prompt for the LLM with instructions.
-    
-    Args:
-        question: user's question
-        context: retrieved document chunks
-        
-    Returns:
-        Complete prompt string
-    """
-    prompt = f"""You are a helpful AI assistant that answers questions based on the provided document context.
-
-IMPORTANT INSTRUCTIONS:
-- Only use information from the context below to answer the question
-- If the answer is not in the context, say "I cannot find this information in the provided documents"
-- Always cite which source and page number you got the information from
-- Be concise and accurate
-
-CONTEXT:
-{context}
-
-QUESTION: {question}
-
-ANSWER:"""
-    
-    return prompt
+    return ollama.Client()
 
 
-def generate_answer(question: str, retrieved_chunks: list) -> dict:
+def generate_answer_stream(question: str, retrieved_chunks: tuple, client: ollama.Client = None):
     """
-    Main RAG function - generates an answer using retrieved context.
+    Streams the answer piece by piece while the LLM is still writing it.
     
     Args:
         question: user's question
-        retrieved_chunks: list of (chunk, distance) tuples from FAISS
+        retrieved_chunks: (chunks, scores) from VectorStore.search
+        client: Ollama client to use (default: the shared one)
         
-    Returns:
-        Dictionary with answer and sources
+    Yields:
+        Pieces of the answer text, in order
     """
     print(f"\nGenerating answer for: '{question}'")
     
     # Build context from retrieved chunks
     context = build_context(retrieved_chunks)
     
-    # Create the full prompt
-    prompt = create_prompt(question, context)
+    # Create the chat messages (instructions + context and question)
+    messages = create_messages(question, context)
     
     print("\n--- Calling LLM ---")
     
-    # Call Ollama API
-    response = ollama.chat(
+    if client is None:
+        client = get_llm_client()
+    
+    # Call Ollama API with stream=True: we get the answer in small pieces
+    stream = client.chat(
         model=LLM_MODEL,
-        messages=[
-            {
-                'role': 'user',
-                'content': prompt
-            }
-        ],
+        messages=messages,
         options={
             'temperature': LLM_TEMPERATURE,
-        }
+        },
+        stream=True,
+        keep_alive=LLM_KEEP_ALIVE
     )
     
-    # Extract the answer
-    answer = response['message']['content']
+    for part in stream:
+        yield part['message']['content']
+
+
+def generate_answer(question: str, retrieved_chunks: tuple, client: ollama.Client = None) -> dict:
+    """
+    Main RAG function - generates an answer using retrieved context.
     
-    # Extract sources from retrieved chunks
-    sources = []
-    for chunk, distance in retrieved_chunks:
-        source_info = {
-            'source': chunk['source'],
-            'page': chunk['page_number'],
-            'relevance': round(1 / (1 + distance), 2)  # Convert distance to relevance score
-        }
-        if source_info not in sources:
-            sources.append(source_info)
+    Args:
+        question: user's question
+        retrieved_chunks: (chunks, scores) from VectorStore.search
+        client: Ollama client to use (default: the shared one)
+        
+    Returns:
+        Dictionary with answer and sources
+    """
+    # Collect the streamed pieces into the full answer
+    answer = "".join(generate_answer_stream(question, retrieved_chunks, client))
     
     return {
         'answer': answer,
-        'sources': sources
+        'sources': get_sources(retrieved_chunks)
     }
 
 # --------------------------------------------------
 # TEST: Full end-to-end RAG pipeline
+# Run `python -m rag.pipeline`
 # --------------------------------------------------
 
 if __name__ == "__main__":
     
     # Import all our previous components
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'ingestion'))
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embeddings'))
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'retrieval'))
-    
-    from pdf_loader import load_pdf
-    from chunker import chunk_pages
-    from embeddings import embed_chunks, embed_text
-    from vector_store import VectorStore
+    from ingestion.pdf_loader import load_pdf
+    from ingestion.chunker import chunk_pages
+    from embeddings.embeddings import embed_chunks, embed_text
+    from retrieval.vector_store import VectorStore
     
     print("="*60)
     print("FULL RAG PIPELINE TEST")
@@ -141,12 +105,12 @@ if __name__ == "__main__":
     print("\n[1/5] Loading and processing PDF...")
     pages = load_pdf("data/raw/test.pdf")
     chunks = chunk_pages(pages)
-    embedded_chunks = embed_chunks(chunks)
+    chunks, embeddings = embed_chunks(chunks)
     
     # Step 4: Build FAISS index
     print("\n[2/5] Building vector store...")
     vector_store = VectorStore()
-    vector_store.add_chunks(embedded_chunks)
+    vector_store.add_chunks(chunks, embeddings)
     
     # Step 5: Ask a question
     question = "What is RAG and how does it work?"
@@ -157,9 +121,9 @@ if __name__ == "__main__":
     query_embedding = embed_text(question)
     retrieved_chunks = vector_store.search(query_embedding, k=TOP_K_RESULTS)
     
-    print(f"Retrieved {len(retrieved_chunks)} chunks:")
-    for i, (chunk, distance) in enumerate(retrieved_chunks, 1):
-        print(f"  {i}. {chunk['source']} (Page {chunk['page_number']}) - Distance: {distance:.4f}")
+    print(f"Retrieved {len(retrieved_chunks[0])} chunks:")
+    for i, (chunk, score) in enumerate(zip(*retrieved_chunks), 1):
+        print(f"  {i}. {chunk['source']} (Page {chunk['page_number']}) - Score: {score:.4f}")
     
     # Step 7: Generate answer
     print("\n[5/5] Generating answer with LLM...")
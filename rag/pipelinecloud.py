@@ -1,66 +1,90 @@
 # rag/pipelinecloud.py
 # Cloud version using Groq API (FREE & FAST)
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
+import asyncio
+import functools
+import httpx
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import TOP_K_RESULTS
+from rag.prompt import build_context, create_messages, get_sources
 
+# Streamlit is optional here: scripts and the async batch functions
+# can use this module without it
+try:
+    import streamlit as st
+except ImportError:
+    st = None
 
-def build_context(retrieved_chunks: list) -> str:
-    """Format retrieved chunks into context string"""
-    context_parts = []
-    
-    for i, (chunk, distance) in enumerate(retrieved_chunks, 1):
-        source_info = f"[Source: {chunk['source']}, Page {chunk['page_number']}]"
-        chunk_text = chunk['text']
-        context_parts.append(f"Chunk {i} {source_info}:\n{chunk_text}\n")
-    
-    return "\n".join(context_parts)
-
+# One shared object per process: Streamlit's resource cache in the app,
+# a plain function cache everywhere else
+cache_resource = st.cache_resource if st is not None else functools.lru_cache(maxsize=None)
 
-def create_prompt(question: str, context: str) -> str:
-    """Create prompt for the LLM"""
-    prompt = f"""You are a helpful AI assistant that answers questions based on the provided document context.
+GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GROQ_TEMPERATURE = 0.2
+GROQ_MAX_TOKENS = 1024
 
-IMPORTANT INSTRUCTIONS:
-- Only use information from the context below to answer the question
-- If the answer is not in the context, say "I cannot find this information in the provided documents"
-- Always cite which source and page number you got the information from
-- Be concise and accurate
+# At most this many open connections to Groq at the same time
+# (shared by all Streamlit sessions, and per agenerate_answers batch)
+GROQ_MAX_CONNECTIONS = 8
 
-CONTEXT:
-{context}
+# The API key, once found (read_api_key fills it in)
+_api_key = None
 
-QUESTION: {question}
 
-ANSWER:"""
+@cache_resource
+def get_llm_client() -> requests.Session:
+    """Create one HTTP session per process so the TLS connection to Groq is reused"""
+    # Retry rate limits / temporary server errors a couple of times (with a
+    # short backoff). Safe for our POST: these responses carry no answer yet.
+    # Failed connections are retried too (nothing was sent yet), but never a
+    # read error or timeout: Groq may already be generating (and billing) that answer.
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        other=0,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False
+    )
     
-    return prompt
+    # We only talk to one host, so one pool of kept-alive connections,
+    # big enough for several sessions asking at once
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_MAX_CONNECTIONS, max_retries=retry))
+    return session
 
 
-def generate_answer(question: str, retrieved_chunks: list) -> dict:
-    """Generate answer using Groq API (FREE)"""
-    import streamlit as st
-    import requests
+def read_api_key() -> str:
+    """Groq API key from Streamlit secrets or the environment (looked up only once)"""
+    global _api_key
+    if _api_key is None:
+        try:
+            _api_key = st.secrets["GROQ_API_KEY"]
+        except:
+            _api_key = os.getenv("GROQ_API_KEY")
     
-    print(f"\nGenerating answer for: '{question}'")
-    
-    # Get API key
-    try:
-        api_key = st.secrets["GROQ_API_KEY"]
-    except:
-        api_key = os.getenv("GROQ_API_KEY")
-    
-    if not api_key:
+    # Not found: leave it unset, so the next question looks again
+    if not _api_key:
+        _api_key = None
         raise ValueError("GROQ_API_KEY not found!")
     
+    return _api_key
+
+
+def build_request(question: str, retrieved_chunks: tuple, stream: bool) -> tuple[dict, dict]:
+    """Build the (headers, payload) of a Groq chat completion request"""
+    api_key = read_api_key()
+    
     # Build context
     context = build_context(retrieved_chunks)
-    prompt = create_prompt(question, context)
-    
-    print("\n--- Calling Groq API ---")
+    messages = create_messages(question, context)
     
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -68,45 +92,128 @@ def generate_answer(question: str, retrieved_chunks: list) -> dict:
     }
     
     payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.2,
-        "max_tokens": 1024
+        "model": GROQ_MODEL,
+        "messages": messages,
+        "temperature": GROQ_TEMPERATURE,
+        "max_tokens": GROQ_MAX_TOKENS,
+        "stream": stream
     }
     
+    return headers, payload
+
+
+def delta_content(data) -> str:
+    """Answer text in one streamed "data: {...}" event ('' when it has none)"""
+    return orjson.loads(data)['choices'][0]['delta'].get('content') or ''
+
+
+def generate_answer_stream(question: str, retrieved_chunks: tuple, client: requests.Session = None):
+    """Stream the answer from Groq API (FREE) piece by piece"""
+    print(f"\nGenerating answer for: '{question}'")
+    
+    headers, payload = build_request(question, retrieved_chunks, stream=True)
+    
+    print("\n--- Calling Groq API ---")
+    
+    if client is None:
+        client = get_llm_client()
+    
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
+        # 'with' hands the connection back to the pool however we leave
+        # this block - also on an error status, or when the caller stops early
+        with client.post(
+            GROQ_URL,
             headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            st.error(f"API Error: {response.status_code} - {response.text}")
-            raise Exception(f"API returned {response.status_code}")
-        
-        result = response.json()
-        answer = result['choices'][0]['message']['content']
+            data=orjson.dumps(payload),   # orjson: much faster than the json module for our large prompts
+            timeout=60,
+            stream=True
+        ) as response:
+            
+            if response.status_code != 200:
+                if st is not None:
+                    st.error(f"API Error: {response.status_code} - {response.text}")
+                raise Exception(f"API returned {response.status_code}")
+            
+            # The answer arrives as server-sent events: one "data: {...}" line per piece,
+            # and a final "data: [DONE]" line. We read the stream to the very end
+            # (instead of stopping at [DONE]) so the connection can be reused.
+            for line in response.iter_lines():
+                if not line.startswith(b"data: ") or line == b"data: [DONE]":
+                    continue
+                
+                piece = delta_content(line[len(b"data: "):])
+                if piece:
+                    yield piece
         
     except Exception as e:
-        st.error(f"Error calling API: {str(e)}")
+        if st is not None:
+            st.error(f"Error calling API: {str(e)}")
         raise
-    
-    # Extract sources
-    sources = []
-    for chunk, distance in retrieved_chunks:
-        source_info = {
-            'source': chunk['source'],
-            'page': chunk['page_number'],
-            'relevance': round(1 / (1 + distance), 2)
-        }
-        if source_info not in sources:
-            sources.append(source_info)
+
+
+def generate_answer(question: str, retrieved_chunks: tuple, client: requests.Session = None) -> dict:
+    """Generate the full answer using Groq API (FREE)"""
+    # Collect the streamed pieces into the full answer
+    answer = "".join(generate_answer_stream(question, retrieved_chunks, client))
     
     return {
         'answer': answer,
-        'sources': sources
-    }
\ No newline at end of file
+        'sources': get_sources(retrieved_chunks)
+    }
+
+
+async def agenerate_answer(question: str, retrieved_chunks: tuple, client: httpx.AsyncClient = None) -> dict:
+    """Async version of generate_answer: waits for Groq without blocking the event loop"""
+    # No client given: open one just for this call
+    if client is None:
+        async with httpx.AsyncClient(timeout=60) as client:
+            return await agenerate_answer(question, retrieved_chunks, client)
+    
+    headers, payload = build_request(question, retrieved_chunks, stream=False)
+    
+    response = await client.post(GROQ_URL, headers=headers, content=orjson.dumps(payload))
+    response.raise_for_status()
+    
+    return {
+        'answer': orjson.loads(response.content)['choices'][0]['message']['content'],
+        'sources': get_sources(retrieved_chunks)
+    }
+
+
+async def agenerate_answer_stream(question: str, retrieved_chunks: tuple, client: httpx.AsyncClient = None):
+    """Async version of generate_answer_stream: yields answer pieces as they arrive"""
+    # No client given: open one just for this call
+    if client is None:
+        async with httpx.AsyncClient(timeout=60) as client:
+            async for piece in agenerate_answer_stream(question, retrieved_chunks, client):
+                yield piece
+        return
+    
+    headers, payload = build_request(question, retrieved_chunks, stream=True)
+    
+    async with client.stream("POST", GROQ_URL, headers=headers, content=orjson.dumps(payload)) as response:
+        if response.status_code != 200:
+            await response.aread()
+            response.raise_for_status()
+        
+        # Same server-sent events as in generate_answer_stream (as text here)
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            
+            piece = delta_content(line[len("data: "):])
+            if piece:
+                yield piece
+
+
+async def agenerate_answers(questions: list[str], retrieved: list[tuple]) -> list[dict]:
+    """Answer many questions concurrently (retrieved[i] = search results for questions[i])"""
+    # One client for the whole batch, so all requests share its pooled
+    # connections. Not a module-level client: an AsyncClient belongs to the
+    # event loop it was created in, and every asyncio.run() starts a new one.
+    limits = httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        return await asyncio.gather(*(
+            agenerate_answer(question, retrieved_chunks, client)
+            for question, retrieved_chunks in zip(questions, retrieved)
+        ))
@@ -0,0 +1,154 @@
+# rag/prompt.py
+# The parts of the RAG pipeline that don't depend on which LLM we call:
+# turning retrieved chunks into a prompt, and listing the sources.
+# Both pipeline.py (local Ollama) and pipelinecloud.py (Groq) use these.
+
+import numpy as np
+from config import CHUNK_OVERLAP
+
+# The instructions never change, so they go first, in their own system
+# message. LLM servers reuse the work done on a repeated prompt start
+# (Ollama keeps it in the loaded model's cache, Groq caches prompt
+# prefixes), so only the context and question are processed per question.
+SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on the provided document context.
+
+IMPORTANT INSTRUCTIONS:
+- Only use information from the provided context to answer the question
+- If the answer is not in the context, say "I cannot find this information in the provided documents"
+- Always cite which source and page number you got the information from
+- Be concise and accurate"""
+
+# The system message itself is shared by every request (it never changes)
+SYSTEM_MESSAGE = {'role': 'system', 'content': SYSTEM_PROMPT}
+
+# Placeholders for the context and question, filled in with .format() per question
+USER_PROMPT_TEMPLATE = """CONTEXT:
+{context}
+
+QUESTION: {question}
+
+ANSWER:"""
+
+# Two retrieved chunks of the same page that start with this many identical
+# characters are treated as the same text
+DEDUP_PREFIX_CHARS = 200
+
+
+def merge_chunks(chunks: list[dict]) -> list[dict]:
+    """
+    Drops repeated chunks and joins neighbouring windows of the same page.
+    
+    The chunker's windows overlap by CHUNK_OVERLAP characters, so when the
+    search finds two neighbours, that text would be sent to the LLM twice.
+    
+    Args:
+        chunks: retrieved chunks, best first
+        
+    Returns:
+        Text blocks ({source, page_number, text}), best first
+    """
+    # Skip chunks we already have (same page, same beginning)
+    unique = []   # (rank, chunk)
+    seen = set()
+    for rank, chunk in enumerate(chunks):
+        key = (chunk['source'], chunk['page_number'], chunk['text'][:DEDUP_PREFIX_CHARS])
+        if key not in seen:
+            seen.add(key)
+            unique.append((rank, chunk))
+    
+    # Walk through the chunks in document order, so neighbours come one after another
+    unique.sort(key=lambda item: (item[1]['source'], item[1]['page_number'], item[1]['chunk_index']))
+    
+    blocks = []   # [best rank, block, index of its last chunk]
+    for rank, chunk in unique:
+        index = chunk['chunk_index']
+        if blocks:
+            best, block, last = blocks[-1]
+            if (block['source'] == chunk['source'] and block['page_number'] == chunk['page_number']
+                    and index == last + 1 and block['text'].endswith(chunk['text'][:CHUNK_OVERLAP])):
+                # Next window of the same page: add only the text after the overlap
+                block['text'] += chunk['text'][CHUNK_OVERLAP:]
+                blocks[-1] = [min(best, rank), block, index]
+                continue
+        
+        block = {'source': chunk['source'], 'page_number': chunk['page_number'], 'text': chunk['text']}
+        blocks.append([rank, block, index])
+    
+    # Back to best first (a merged block counts as its best chunk)
+    blocks.sort(key=lambda item: item[0])
+    return [block for _, block, _ in blocks]
+
+
+def build_context(retrieved_chunks: tuple) -> str:
+    """
+    Takes the retrieved chunks and formats them into a context string.
+    
+    Args:
+        retrieved_chunks: (chunks, scores) from VectorStore.search
+        
+    Returns:
+        Formatted context string with sources
+    """
+    # Fewer, non-repeating blocks = fewer prompt tokens to pay for
+    chunks, _ = retrieved_chunks
+    blocks = merge_chunks(chunks)
+    
+    # One formatted block per chunk, joined in a single pass.
+    # str.join measures all parts first and allocates the result once,
+    # so this stays a single copy even for a large TOP_K_RESULTS.
+    return "\n".join(
+        f"Chunk {i} [Source: {block['source']}, Page {block['page_number']}]:\n{block['text']}\n"
+        for i, block in enumerate(blocks, 1)
+    )
+
+
+def create_messages(question: str, context: str) -> list[dict]:
+    """
+    Creates the chat messages for the LLM: fixed instructions + this question.
+    
+    Args:
+        question: user's question
+        context: retrieved document chunks
+        
+    Returns:
+        [system message, user message] in the chat API format
+    """
+    # Only the user message is built per question
+    return [
+        SYSTEM_MESSAGE,
+        {'role': 'user', 'content': USER_PROMPT_TEMPLATE.format(context=context, question=question)}
+    ]
+
+
+def get_sources(retrieved_chunks: tuple) -> list[dict]:
+    """
+    Lists the unique (document, page) pairs the answer is based on.
+    
+    Args:
+        retrieved_chunks: (chunks, scores) from VectorStore.search
+        
+    Returns:
+        List of source dicts with source, page and relevance
+    """
+    chunks, scores = retrieved_chunks
+    
+    # Map all cosine scores (-1..1) to relevance (0..1) at once.
+    # In float64: 0.95 rounded as float32 would print as 0.949999988079071
+    relevances = np.round((scores.astype(np.float64) + 1) / 2, 2).tolist()
+    
+    sources = []
+    seen = set()   # (document, page) pairs already listed
+    for chunk, relevance in zip(chunks, relevances):
+        # Chunks come best-first, so the first one of each page is kept
+        key = (chunk['source'], chunk['page_number'])
+        if key in seen:
+            continue
+        seen.add(key)
+        
+        sources.append({
+            'source': chunk['source'],
+            'page': chunk['page_number'],
+            'relevance': relevance
+        })
+    
+    return sources
@@ -0,0 +1,206 @@
+# rag/semantic_cache.py
+# A "semantic" answer cache.
+# We remember the embedding of every question we answered, together with the answer.
+# When a new question means (almost) the same thing as an old one,
+# we return the saved answer instead of calling the LLM again.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import faiss
+import numpy as np
+from config import EMBEDDING_DIM, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, VECTOR_STORE_DIR
+
+# How many similar old questions to check per lookup
+# (the most similar one may be about other chunks, or too old)
+LOOKUP_CANDIDATES = 4
+
+
+def hash_context(retrieved_chunks: tuple) -> str:
+    """
+    Fingerprint of the chunks an answer is based on.
+
+    Two similar questions only share an answer when the search also
+    found the same chunks for them. We hash what the LLM saw (file name,
+    page and text of each chunk), not the chunk IDs: an edited PDF
+    uploaded under the same name keeps its chunk IDs, but its answers
+    must not be reused.
+
+    Args:
+        retrieved_chunks: (chunks, scores) from VectorStore.search
+
+    Returns:
+        SHA-256 hex digest of the chunks' source, page and text, in order
+    """
+    chunks, _ = retrieved_chunks
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(f"{chunk['source']}|{chunk['page_number']}|{chunk['text']}".encode("utf-8"))
+        digest.update(b"\0")   # separator, so two chunks never read as one
+    return digest.hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Same question, different spacing / capitals → same text"""
+    return " ".join(question.lower().split())
+
+
+class SemanticCache:
+    """
+    Stores (question embedding → answer) pairs and finds near-duplicate questions.
+
+    The apps share one cache per process between all sessions, so every
+    method takes self.lock first.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache"""
+        # Reentrant: save_to_disk calls remove_expired while holding it
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Forget all answers (e.g. after new documents were processed)"""
+        with self.lock:
+            # Our embeddings are normalized, so inner product = cosine similarity
+            self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
+
+            # entries[i] belongs to the i-th question in the index:
+            # {"question", "context", "time", "result"}
+            self.entries = []
+
+            # "context|question" → position in entries, for exact repeats
+            self.exact = {}
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Answers older than SEMANTIC_CACHE_TTL seconds are not reused"""
+        return time.time() - entry["time"] < SEMANTIC_CACHE_TTL
+
+    def lookup(self, question: str, query_embedding, context_hash: str, threshold=SEMANTIC_CACHE_THRESHOLD):
+        """
+        Find a saved answer for a question that means the same thing.
+
+        Args:
+            question: the question text
+            query_embedding: the embedded question (384-dim, normalized)
+            context_hash: hash_context() of the chunks found for this question
+            threshold: minimum cosine similarity to count as the same question
+
+        Returns:
+            The saved answer dict, or None if nothing is similar enough
+        """
+        with self.lock:
+            # Exact same question about the same chunks: a dictionary lookup is enough
+            position = self.exact.get(f"{context_hash}|{normalize_question(question)}")
+            if position is not None and self.is_fresh(self.entries[position]):
+                print("Semantic cache hit (exact question)")
+                return self.entries[position]["result"]
+
+            if self.index.ntotal == 0:
+                return None
+
+            query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+            k = min(LOOKUP_CANDIDATES, self.index.ntotal)
+            similarities, indices = self.index.search(query_vector, k)
+
+            # Candidates come most similar first
+            for similarity, position in zip(similarities[0], indices[0]):
+                if similarity < threshold:
+                    break
+
+                entry = self.entries[position]
+                if entry["context"] == context_hash and self.is_fresh(entry):
+                    print(f"Semantic cache hit (similarity {similarity:.3f})")
+                    return entry["result"]
+
+            return None
+
+    def add(self, question: str, query_embedding, context_hash: str, result: dict):
+        """
+        Remember the answer to a question.
+
+        Args:
+            question: the question text
+            query_embedding: the embedded question
+            context_hash: hash_context() of the chunks the answer is based on
+            result: the dict returned by generate_answer
+        """
+        with self.lock:
+            query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+            self.index.add(query_vector)
+
+            normalized = normalize_question(question)
+            self.exact[f"{context_hash}|{normalized}"] = len(self.entries)
+            self.entries.append({
+                "question": normalized,
+                "context": context_hash,
+                "time": time.time(),
+                "result": result
+            })
+
+    def remove_expired(self):
+        """
+        Drop answers older than SEMANTIC_CACHE_TTL, so the cache doesn't grow forever.
+        """
+        with self.lock:
+            keep = [i for i, entry in enumerate(self.entries) if self.is_fresh(entry)]
+            if len(keep) == len(self.entries):
+                return
+
+            # Rebuild the index with only the vectors we keep
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
+            self.index.add(vectors[keep])
+
+            self.entries = [self.entries[i] for i in keep]
+            self.exact = {
+                f"{entry['context']}|{entry['question']}": i
+                for i, entry in enumerate(self.entries)
+            }
+
+    def save_to_disk(self):
+        """
+        Save the cache next to the vector store, so it matches that index.
+        """
+        with self.lock:
+            os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+            self.remove_expired()
+
+            # Write new files and swap them in, so a crash mid-write
+            # never leaves a half-written cache behind
+            index_path = os.path.join(VECTOR_STORE_DIR, "qcache.faiss")
+            results_path = os.path.join(VECTOR_STORE_DIR, "qcache.json")
+
+            faiss.write_index(self.index, index_path + ".tmp")
+            # default=float turns numpy numbers (e.g. relevance scores) into plain floats
+            with open(results_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, default=float)
+
+            os.replace(index_path + ".tmp", index_path)
+            os.replace(results_path + ".tmp", results_path)
+
+    def load_from_disk(self):
+        """
+        Load a previously saved cache from disk.
+        """
+        with self.lock:
+            index_path = os.path.join(VECTOR_STORE_DIR, "qcache.faiss")
+            results_path = os.path.join(VECTOR_STORE_DIR, "qcache.json")
+
+            if not os.path.exists(index_path) or not os.path.exists(results_path):
+                return False
+
+            with open(results_path, encoding="utf-8") as f:
+                entries = json.load(f)
+
+            self.index = faiss.read_index(index_path)
+            self.entries = entries
+            self.exact = {
+                f"{entry['context']}|{entry['question']}": i
+                for i, entry in enumerate(self.entries)
+            }
+
+            print(f"✓ Loaded semantic cache with {self.index.ntotal} answers")
+            return True
@@ -3,15 +3,79 @@
 # FAISS = Facebook AI Similarity Search - ultra-fast nearest neighbor search.
 # We store all chunk embeddings here and can search them by similarity.
 
-import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
+import hashlib
 import faiss
 import numpy as np
-import pickle
+import pyarrow as pa
+import pyarrow.feather as feather
 from pathlib import Path
-from config import EMBEDDING_DIM, TOP_K_RESULTS, VECTOR_STORE_DIR
+from config import EMBEDDING_DIM, TOP_K_RESULTS, VECTOR_STORE_DIR, IVF_MIN_VECTORS, IVF_NPROBE, FAISS_USE_GPU, FLAT_INDEX_ENCODING, BRUTE_FORCE_MAX_VECTORS, FAISS_NUM_THREADS
+
+# Limit FAISS to a few threads (the setting is shared by the whole process)
+faiss.omp_set_num_threads(int(os.getenv("FAISS_NUM_THREADS", FAISS_NUM_THREADS)))
+
+# FLAT_INDEX_ENCODING (config.py) → FAISS scalar quantizer type
+SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# int8 needs to learn the value range of every dimension first;
+# a sample of this many vectors is plenty for that
+SQ_TRAIN_SAMPLE = 10_000
+
+# Column layout of the chunk metadata table (one row per chunk)
+# "source" is dictionary-encoded: every file name is stored once, and each
+# row only keeps a small number pointing to it (a PDF has many chunks)
+# "id" is the chunk's ID in the FAISS index (see stable_id)
+CHUNK_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("text", pa.string()),
+    ("source", pa.dictionary(pa.int32(), pa.string())),
+    ("page_number", pa.int32()),
+    ("chunk_index", pa.int32()),
+    ("id", pa.int64()),
+])
+
+# The columns search results show (everything except the FAISS ID)
+RESULT_COLUMNS = ["chunk_id", "text", "source", "page_number", "chunk_index"]
+
+
+def stable_id(text_digest: bytes) -> int:
+    """
+    FAISS ID of a chunk: the first 8 bytes of the SHA-256 of its text,
+    as a positive int64 (FAISS uses -1 for "no result").
+
+    The same text always gets the same ID - in every process and every
+    rebuild of the index (Python's hash() changes per process).
+    """
+    return int.from_bytes(text_digest[:8], "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def _prefetch_file(path: str):
+    """
+    Ask the OS to start reading a file into memory in the background.
+
+    Our chunk table is memory-mapped, so the first search would otherwise
+    wait for the disk. With this hint the reading happens while
+    the user is still typing their question.
+    """
+    # posix_fadvise only exists on Linux/Unix (not on Windows)
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def gpu_available() -> bool:
+    """True when FAISS_USE_GPU is on and FAISS can see at least one GPU"""
+    # faiss-cpu also has get_num_gpus(), it just always returns 0
+    return FAISS_USE_GPU and faiss.get_num_gpus() > 0
 
 
 class VectorStore:
@@ -21,38 +85,178 @@ class VectorStore:
 
     def __init__(self):
         """Initialize empty FAISS index"""
-        # IndexFlatL2 = exact search using L2 (Euclidean) distance
-        # For semantic search, cosine similarity is better, but FAISS L2 works well
-        self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
+        # Exact search using inner product, like IndexFlatIP, but each number
+        # is stored as float16 (or int8, see FLAT_INDEX_ENCODING) instead of
+        # float32: half (a quarter) of the memory and bytes to scan per search.
+        # Our embeddings are normalized (length 1), so inner product = cosine
+        # similarity, and it is cheaper to compute than L2 distance.
+        # (On the GPU we start from a plain IndexFlatIP: the GPU copy stores
+        # it as float16 itself, and FAISS can't move the CPU float16 index.)
+        if gpu_available():
+            flat_index = faiss.IndexFlatIP(EMBEDDING_DIM)
+        else:
+            flat_index = faiss.IndexScalarQuantizer(EMBEDDING_DIM, SQ_TYPES[FLAT_INDEX_ENCODING], faiss.METRIC_INNER_PRODUCT)
+
+        # IndexIDMap2 lets us give every vector our own int64 ID (= its row in self.metadata)
+        self.index = faiss.IndexIDMap2(flat_index)
+        self.on_gpu = False
+        self._move_to_gpu()
         
         # This will store our chunk metadata (text, source, page number)
-        self.chunks = []
+        # as a column table instead of a list of Python dicts
+        self.metadata = CHUNK_SCHEMA.empty_table()
+
+        # SHA-256 of every chunk text in the index, so the same text is never added twice
+        self.seen = set()
+
+        # FAISS IDs sorted, and the metadata row of each (built on the first search)
+        self._sorted_ids = None
+        self._sorted_rows = None
+
+        # Small collections: all vectors as one float32 matrix, row i = metadata row i
+        # (searched with numpy instead of FAISS, see BRUTE_FORCE_MAX_VECTORS)
+        self._mat = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
         
         print(f"Initialized FAISS index (dimension: {EMBEDDING_DIM})")
 
-    def add_chunks(self, chunks_with_embeddings: list[dict]):
+    def _build_ivf_index(self, embeddings: np.ndarray):
         """
-        Add chunks and their embeddings to the FAISS index.
+        Build and train an approximate IVF + PQ index for large collections.
+
+        OPQ64_128     = rotate and shrink vectors to 128 dims so they compress well
+        IVF..._HNSW32 = split vectors into clusters, find clusters with a small graph
+        PQ64x4fs      = compress each vector to 64 codes of 4 bits = 32 bytes
+                        (instead of 384 * 4). "fs" = FastScan: 4-bit codes let
+                        the CPU compare many vectors at once with SIMD instructions
 
         Args:
-            chunks_with_embeddings: list of chunk dicts with 'embedding' key
+            embeddings: the first batch of vectors, used to learn the clusters
         """
-        print(f"\nAdding {len(chunks_with_embeddings)} chunks to FAISS index...")
+        # Rule of thumb: about 4 * sqrt(N) clusters
+        # (IVF_MIN_VECTORS keeps N large enough for 39+ training vectors per cluster)
+        nlist = int(4 * np.sqrt(len(embeddings)))
+        index = faiss.index_factory(EMBEDDING_DIM, f"OPQ64_128,IVF{nlist}_HNSW32,PQ64x4fs", faiss.METRIC_INNER_PRODUCT)
 
-        # Extract just the embeddings as a numpy array
-        embeddings = np.array([chunk["embedding"] for chunk in chunks_with_embeddings])
-        
-        # Make sure embeddings are float32 (FAISS requirement)
-        embeddings = embeddings.astype('float32')
+        print(f"Training IVF index with {nlist} clusters on {len(embeddings)} vectors...")
+        index.train(embeddings)
+        return index
 
-        # Add to FAISS index
-        self.index.add(embeddings)
+    def _move_to_gpu(self):
+        """
+        Copy the index to all GPUs (if enabled), where flat search runs on
+        the much faster GPU memory. Only plain IndexFlat indexes are moved:
+        FAISS has no GPU version of our FastScan IVF index, nor of the
+        float16 / int8 ScalarQuantizer index built on the CPU.
+        """
+        if not gpu_available():
+            return
+
+        # Our indexes are IndexIDMap2 wrappers; look at the index inside
+        if not isinstance(faiss.downcast_index(self.index.index), faiss.IndexFlat):
+            return
+
+        options = faiss.GpuMultipleClonerOptions()
+        options.useFloat16 = True   # half the GPU memory, like the CPU index
+        try:
+            self.index = faiss.index_cpu_to_all_gpus(self.index, options)
+            self.on_gpu = True
+            print(f"✓ FAISS index is on {faiss.get_num_gpus()} GPU(s)")
+        except RuntimeError as e:
+            print(f"Keeping FAISS index on the CPU ({e})")
+
+    def _set_search_params(self):
+        """Set nprobe when the index is an IVF index (flat indexes have nothing to tune)"""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = IVF_NPROBE
+
+    def add_chunks(self, chunks: list[dict], embeddings: np.ndarray):
+        """
+        Add chunks and their embeddings to the FAISS index.
 
-        # Store the full chunk data (we need this to show results later)
-        self.chunks.extend(chunks_with_embeddings)
+        Args:
+            chunks    : list of chunk dicts from chunker.py
+            embeddings: (N, 384) matrix from embed_chunks, row i = chunks[i]
+        """
+        print(f"\nAdding {len(chunks)} chunks to FAISS index...")
+
+        # Make sure embeddings are one contiguous float32 block (FAISS requirement)
+        # This is a no-op when embed_chunks already returned float32
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not embeddings.flags.writeable:
+            embeddings = embeddings.copy()
+
+        # Inner product only equals cosine similarity for length-1 vectors.
+        # embed_chunks already normalizes, so this (in place, SIMD) is just a
+        # cheap guarantee for vectors that come from anywhere else.
+        faiss.normalize_L2(embeddings)
+
+        # Skip chunks whose exact text is already indexed (e.g. unchanged pages
+        # of a re-uploaded PDF) - they would only show up as duplicate results
+        keep = []
+        ids = []
+        for i, chunk in enumerate(chunks):
+            digest = hashlib.sha256(chunk["text"].encode("utf-8")).digest()
+            if digest not in self.seen:
+                self.seen.add(digest)
+                keep.append(i)
+                ids.append(stable_id(digest))
+        ids = np.array(ids, dtype=np.int64)
+
+        if len(keep) < len(chunks):
+            print(f"Skipping {len(chunks) - len(keep)} duplicate chunks")
+            chunks = [chunks[i] for i in keep]
+            embeddings = embeddings[keep]
+
+        # Nothing new (e.g. a scanned PDF without text): an untrained int8
+        # index would refuse even an empty add, so stop here
+        if not chunks:
+            print("No new chunks to add")
+            return
+
+        # Big first batch: switch from exact search to a trained IVF index
+        if self.index.ntotal == 0 and len(embeddings) >= IVF_MIN_VECTORS:
+            self.index = faiss.IndexIDMap2(self._build_ivf_index(embeddings))
+            self.on_gpu = False
+            self._set_search_params()
+
+        # int8 encoding: learn the value ranges from (an evenly spread sample of) the first batch
+        if not self.index.is_trained:
+            step = max(1, len(embeddings) // SQ_TRAIN_SAMPLE)
+            print(f"Training {FLAT_INDEX_ENCODING} encoding...")
+            self.index.train(np.ascontiguousarray(embeddings[::step]))
+
+        # Add to FAISS index, each vector under its chunk's stable ID
+        self.index.add_with_ids(embeddings, ids)
+
+        # Store the chunk data (we need this to show results later)
+        new_rows = pa.Table.from_pylist(chunks, schema=CHUNK_SCHEMA)
+        new_rows = new_rows.set_column(CHUNK_SCHEMA.get_field_index("id"), "id", pa.array(ids))
+        self.metadata = pa.concat_tables([self.metadata, new_rows])
+        self._sorted_ids = None   # the ID → row lookup is outdated now
+
+        # Keep the numpy copy only while the collection is small
+        if self._mat is not None and self.index.ntotal < BRUTE_FORCE_MAX_VECTORS:
+            self._mat = np.vstack([self._mat, embeddings])
+        else:
+            self._mat = None
 
         print(f"✓ Index now contains {self.index.ntotal} vectors")
 
+    def _rows_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Turn FAISS IDs into rows of self.metadata.
+
+        Uses a sorted copy of the ID column and a binary search per ID
+        (numpy does all of them at once) instead of a Python dict.
+        """
+        if self._sorted_ids is None:
+            all_ids = self.metadata.column("id").to_numpy()
+            self._sorted_rows = np.argsort(all_ids)
+            self._sorted_ids = all_ids[self._sorted_rows]
+
+        return self._sorted_rows[np.searchsorted(self._sorted_ids, ids)]
+
     def search(self, query_embedding, k=TOP_K_RESULTS):
         """
         Search for the top-k most similar chunks to a query.
@@ -62,27 +266,81 @@ class VectorStore:
             k: how many results to return
 
         Returns:
-            List of (chunk, distance) tuples, ordered by relevance
+            (chunks, scores): the matched chunk dicts, best first, and a numpy
+            array with their scores (cosine similarity, from -1 to 1, higher = more similar)
         """
-        # Make sure query is the right shape and type
-        query_vector = np.array([query_embedding]).astype('float32')
+        chunks, scores = self.search_batch([query_embedding], k)[0]
+
+        print(f"\nFound {len(chunks)} relevant chunks")
+        return chunks, scores
+
+    def search_batch(self, query_embeddings, k=TOP_K_RESULTS):
+        """
+        Search for several queries with one FAISS call.
+
+        FAISS scans the index once for the whole batch instead of once per
+        query, which is much faster than calling search() in a loop.
+
+        Args:
+            query_embeddings: (N, 384) matrix or list of query vectors
+            k: how many results to return per query
+
+        Returns:
+            One (chunks, scores) pair per query, like search()
+        """
+        # Make sure the queries are one float32 matrix (a new array, so we
+        # can normalize it in place without touching the caller's vectors)
+        query_vectors = np.array(query_embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        faiss.normalize_L2(query_vectors)
+
+        if self._mat is not None:
+            return self._search_matrix(query_vectors, k)
 
         # Search the index
-        # distances = how far each result is (lower = more similar)
+        # scores = similarity of each result (higher = more similar)
         # indices = which chunks matched
-        distances, indices = self.index.search(query_vector, k)
+        scores, indices = self.index.search(query_vectors, k)
 
-        # Build results list
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.chunks):  # safety check
-                chunk = self.chunks[idx]
-                distance = distances[0][i]
-                results.append((chunk, distance))
+        # Drop empty result slots (IVF returns -1 when it finds fewer than k)
+        found = indices >= 0
+
+        # Look up the matched rows of all queries at once; then give every
+        # query its own slice (the scores stay numpy arrays)
+        rows = self._rows_for_ids(indices[found])
+        matched = self.metadata.select(RESULT_COLUMNS).take(rows).to_pylist()
+        counts = found.sum(axis=1)
 
-        print(f"\nFound {len(results)} relevant chunks")
+        results = []
+        start = 0
+        for row, count in enumerate(counts):
+            results.append((matched[start:start + count], scores[row][found[row]]))
+            start += count
         return results
 
+    def _search_matrix(self, query_vectors: np.ndarray, k: int):
+        """
+        Exact search of small collections with numpy (same results as search_batch).
+
+        One matrix multiplication scores every chunk for every query;
+        argpartition then picks the top k without sorting all scores.
+        """
+        k = min(k, len(self._mat))
+        if k == 0:
+            return [([], np.empty(0, dtype=np.float32)) for _ in query_vectors]
+
+        all_scores = query_vectors @ self._mat.T
+
+        # Top k per query (unordered), then sort just those k, best first
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(all_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        rows = np.take_along_axis(top, order, axis=1)
+        scores = np.take_along_axis(top_scores, order, axis=1)
+
+        # Rows of _mat are rows of the metadata table: no ID lookup needed
+        matched = self.metadata.select(RESULT_COLUMNS).take(rows.ravel()).to_pylist()
+        return [(matched[i * k:(i + 1) * k], scores[i]) for i in range(len(query_vectors))]
+
     def save_to_disk(self):
         """
         Save the FAISS index and chunk metadata to disk.
@@ -91,14 +349,27 @@ class VectorStore:
         # Create directory if it doesn't exist
         os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
 
-        # Save FAISS index
+        # A store loaded earlier may still have the old chunk table
+        # memory-mapped (and be searched by other sessions). Overwriting a
+        # mapped file crashes the process on its next read, so we write new
+        # files next to the old ones and swap them in: os.replace gives the
+        # path to the new file, while the mapping keeps the old one alive.
         index_path = os.path.join(VECTOR_STORE_DIR, "faiss.index")
-        faiss.write_index(self.index, index_path)
+        chunks_path = os.path.join(VECTOR_STORE_DIR, "chunks.feather")
+
+        # Save FAISS index
+        # (a GPU index has to be copied back to the CPU to be written)
+        index = faiss.index_gpu_to_cpu(self.index) if self.on_gpu else self.index
+        faiss.write_index(index, index_path + ".tmp")
+
+        # Save chunk metadata as a Feather file (= the Arrow IPC file format)
+        # Uncompressed, so it can be memory-mapped when loading.
+        # Every add_chunks call brought its own file-name dictionary; the
+        # file format needs one shared dictionary per column, so merge them.
+        feather.write_feather(self.metadata.unify_dictionaries(), chunks_path + ".tmp", compression="uncompressed")
 
-        # Save chunk metadata using pickle
-        chunks_path = os.path.join(VECTOR_STORE_DIR, "chunks.pkl")
-        with open(chunks_path, "wb") as f:
-            pickle.dump(self.chunks, f)
+        os.replace(index_path + ".tmp", index_path)
+        os.replace(chunks_path + ".tmp", chunks_path)
 
         print(f"\n✓ Saved index to {VECTOR_STORE_DIR}")
 
@@ -107,45 +378,66 @@ class VectorStore:
         Load a previously saved FAISS index from disk.
         """
         index_path = os.path.join(VECTOR_STORE_DIR, "faiss.index")
-        chunks_path = os.path.join(VECTOR_STORE_DIR, "chunks.pkl")
+        chunks_path = os.path.join(VECTOR_STORE_DIR, "chunks.feather")
+
+        # The first version of this project pickled the chunks next to an
+        # L2 index; that format can't be read anymore
+        if os.path.exists(os.path.join(VECTOR_STORE_DIR, "chunks.pkl")) and not os.path.exists(chunks_path):
+            raise ValueError("The saved index is from an older version. Please process your documents again.")
 
         if not os.path.exists(index_path) or not os.path.exists(chunks_path):
             print("No saved index found. Starting fresh.")
             return False
 
-        # Load FAISS index
-        self.index = faiss.read_index(index_path)
+        # Load FAISS index (read completely into memory: FAISS can't
+        # memory-map our ID-mapped flat or FastScan IVF indexes).
+        # The set of already indexed texts is not saved, so treat a loaded
+        # store as read-only — to add documents, build a new store.
+        index = faiss.read_index(index_path)
+
+        self.index = index
+        self._set_search_params()
+
+        # Small flat index: decode its vectors once into the numpy search matrix
+        # (the inner index holds them in the order of the metadata rows)
+        if index.ntotal < BRUTE_FORCE_MAX_VECTORS and faiss.try_extract_index_ivf(index) is None:
+            inner = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+            self._mat = inner.reconstruct_n(0, index.ntotal)
+        else:
+            self._mat = None
+
+        self._move_to_gpu()
+
+        # Load chunk metadata (memory-mapped, the OS reads pages as we need them)
+        self.metadata = feather.read_table(chunks_path, memory_map=True)
+        self._sorted_ids = None
 
-        # Load chunk metadata
-        with open(chunks_path, "rb") as f:
-            self.chunks = pickle.load(f)
+        # Start pulling the chunk table into the page cache in the background
+        _prefetch_file(chunks_path)
 
         print(f"✓ Loaded index with {self.index.ntotal} vectors from disk")
         return True
 
 
 # --------------------------------------------------
-# TEST: Run this file directly to test it
+# TEST: Run `python -m retrieval.vector_store` to test it
 # --------------------------------------------------
 
 if __name__ == "__main__":
 
     # Import our previous components
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'ingestion'))
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embeddings'))
-    
-    from pdf_loader import load_pdf
-    from chunker import chunk_pages
-    from embeddings import embed_chunks, embed_text
+    from ingestion.pdf_loader import load_pdf
+    from ingestion.chunker import chunk_pages
+    from embeddings.embeddings import embed_chunks, embed_text
 
     # Step 1-3: Load, chunk, and embed
     pages = load_pdf("data/raw/test.pdf")
     chunks = chunk_pages(pages)
-    embedded_chunks = embed_chunks(chunks)
+    chunks, embeddings = embed_chunks(chunks)
 
     # Step 4: Build FAISS index
     vector_store = VectorStore()
-    vector_store.add_chunks(embedded_chunks)
+    vector_store.add_chunks(chunks, embeddings)
 
     # Step 5: Test search with a query
     print("\n" + "="*50)
@@ -159,14 +451,14 @@ if __name__ == "__main__":
     query_embedding = embed_text(test_query)
 
     # Search
-    results = vector_store.search(query_embedding, k=2)
+    chunks_found, scores = vector_store.search(query_embedding, k=2)
 
     # Show results
-    for i, (chunk, distance) in enumerate(results, 1):
+    for i, (chunk, score) in enumerate(zip(chunks_found, scores), 1):
         print(f"\n--- Result {i} ---")
         print(f"Chunk ID : {chunk['chunk_id']}")
         print(f"Source   : {chunk['source']} (Page {chunk['page_number']})")
-        print(f"Distance : {distance:.4f}")
+        print(f"Score    : {score:.4f}")
         print(f"Text     : {chunk['text'][:150]}...")
 
     # Step 6: Save to disk for later